@@ -3,6 +3,7 @@ Application configuration using environment variables
 Follows 12-factor app methodology for cloud-native deployments
 """
 
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -25,6 +26,20 @@ class Settings(BaseSettings):
     # Elasticsearch configuration
     ELASTICSEARCH_HOST: str = "http://elasticsearch:9200"  # K8s service name
     ELASTICSEARCH_INDEX: str = "cities"
+    ELASTICSEARCH_POOL_MAXSIZE: int = 100  # Connections per node in client pool
+    ELASTICSEARCH_REFRESH_INTERVAL: str = "1s"  # How often writes become searchable
+
+    # Lookup batching: concurrent GETs are coalesced into a single mget
+    ELASTICSEARCH_BATCH_MAX_SIZE: int = 100
+    ELASTICSEARCH_BATCH_MAX_WAIT_MS: float = 2.0
+
+    # In-process lookup cache, off by default (0); when enabled, writes made
+    # through other replicas/workers may be served stale for up to the TTL
+    CACHE_TTL_SECONDS: float = 0.0
+    CACHE_MAXSIZE: int = 4096
+
+    # Seconds a health check result is reused across probes
+    HEALTH_CACHE_TTL: float = 1.0
 
     # Optional: Authentication (for production)
     ELASTICSEARCH_USER: Optional[str] = None
@@ -37,5 +52,10 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the process-wide settings instance
+    Environment is parsed on first call only; usable as a FastAPI dependency
+    """
+    return Settings()
@@ -4,8 +4,12 @@ Handles all database interactions with proper error handling and connection mana
 """
 
 from elasticsearch import AsyncElasticsearch
-from typing import Optional, List, Dict, Any
+from elasticsearch.helpers import async_bulk
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Union
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -16,18 +20,64 @@ class ElasticsearchClient:
     Implements connection pooling and automatic reconnection
     """
 
-    def __init__(self, hosts: str, index_name: str):
+    def __init__(
+        self,
+        hosts: str,
+        index_name: str,
+        batch_max_size: int = 100,
+        batch_max_wait_ms: float = 2.0,
+        pool_maxsize: int = 100,
+        refresh_interval: str = "1s",
+        cache_maxsize: int = 4096,
+        cache_ttl: float = 0.0,
+        health_cache_ttl: float = 1.0
+    ):
         """
         Initialize Elasticsearch client configuration
 
         Args:
             hosts: Elasticsearch host URL (e.g., 'http://elasticsearch:9200')
             index_name: Name of the index to store city data
+            batch_max_size: Max number of lookups coalesced into one mget
+            batch_max_wait_ms: Max time a lookup waits for others to join its batch
+            pool_maxsize: Max open HTTP connections per Elasticsearch node
+            refresh_interval: Index refresh interval that makes writes searchable
+            cache_maxsize: Max number of cities kept in the lookup cache
+            cache_ttl: Seconds a cached lookup stays valid (0, the default,
+                disables caching; other replicas' writes show up only after it expires)
+            health_cache_ttl: Seconds a cluster health result is reused
         """
         self.hosts = hosts
         self.index_name = index_name
+        self.pool_maxsize = pool_maxsize
+        self.refresh_interval = refresh_interval
         self.client: Optional[AsyncElasticsearch] = None
 
+        # Concurrent lookups are queued and resolved together with one mget
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait = batch_max_wait_ms / 1000
+        self._lookup_queue: Optional[asyncio.Queue] = None
+        self._batcher_task: Optional[asyncio.Task] = None
+        self._batch_tasks: set = set()
+
+        # In-process LRU cache of lookups: city -> (expiry time, population)
+        # Only found cities are cached, so a city created on another replica
+        # is never hidden behind a cached miss; local writes refresh the entry
+        self.cache_maxsize = cache_maxsize
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self._cache_version = 0  # Bumped on every write to discard racing reads
+
+        # Lookups currently waiting on Elasticsearch, keyed by city, so
+        # concurrent requests for the same city share one result
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Cached cluster health: (timestamp, healthy); the lock collapses
+        # simultaneous probes into a single Elasticsearch call
+        self.health_cache_ttl = health_cache_ttl
+        self._health_cache: Tuple[float, bool] = (0.0, False)
+        self._health_lock = asyncio.Lock()
+
     async def connect(self):
         """
         Establish connection to Elasticsearch cluster
@@ -35,11 +85,18 @@ class ElasticsearchClient:
         """
         try:
             # Initialize async Elasticsearch client with connection pooling
+            # The pool is sized for the API's request concurrency; the client
+            # must be created once and reused, never per request
             self.client = AsyncElasticsearch(
                 hosts=[self.hosts],
                 request_timeout=30,
                 max_retries=3,
-                retry_on_timeout=True
+                retry_on_timeout=True,
+                connections_per_node=self.pool_maxsize,
+                node_class="aiohttp",  # Persistent keep-alive sockets via aiohttp
+                http_compress=True,  # Gzip request/response bodies
+                sniff_on_start=False,
+                sniff_on_node_failure=False
             )
 
             # Wait for cluster to be ready
@@ -52,33 +109,75 @@ class ElasticsearchClient:
                     body={
                         "mappings": {
                             "properties": {
+                                # Lookups go through _id, so neither field needs
+                                # an inverted index; city keeps doc_values only
+                                # as the sort key for paginated listing
                                 "city": {
-                                    "type": "keyword"  # Exact match for city names
+                                    "type": "keyword",
+                                    "index": False
                                 },
                                 "population": {
-                                    "type": "long"  # Integer type for population
+                                    "type": "long",  # Integer type for population
+                                    "index": False,
+                                    "doc_values": False
                                 }
                             }
                         },
                         "settings": {
                             "number_of_shards": 1,  # Single shard for small dataset
-                            "number_of_replicas": 1  # One replica for HA
+                            "number_of_replicas": 1,  # One replica for HA
+                            "refresh_interval": self.refresh_interval  # Batch refreshes
                         }
                     }
                 )
-                logger.info(f"Created index: {self.index_name}")
+                logger.info("Created index: %s", self.index_name)
 
-            logger.info(f"Connected to Elasticsearch at {self.hosts}")
+            # Start background task that coalesces concurrent lookups
+            self._lookup_queue = asyncio.Queue()
+            self._batcher_task = asyncio.create_task(self._run_batcher())
+
+            logger.info("Connected to Elasticsearch at %s", self.hosts)
 
         except Exception as e:
-            logger.error(f"Failed to connect to Elasticsearch: {str(e)}")
+            logger.error("Failed to connect to Elasticsearch: %s", e)
             raise
 
+    async def warm_up(self, connections: int):
+        """
+        Open pooled connections and warm the index before serving traffic
+        Moves connection setup and first-query costs out of user requests
+
+        Args:
+            connections: Number of concurrent requests used to fill the pool
+        """
+        try:
+            # Concurrent requests force the pool to open several sockets
+            await asyncio.gather(*[
+                self.client.cluster.health() for _ in range(max(connections, 1))
+            ])
+
+            # Empty search touches the index shards without fetching documents
+            await self.client.search(index=self.index_name, body={"size": 0})
+
+            logger.info("Warmed up %s Elasticsearch connections", connections)
+
+        except Exception as e:
+            # Warm-up is best effort; requests will open connections on demand
+            logger.warning("Elasticsearch warm-up failed: %s", e)
+
     async def close(self):
         """
         Gracefully close Elasticsearch connection
         Should be called during application shutdown
         """
+        if self._batcher_task:
+            self._batcher_task.cancel()
+            try:
+                await self._batcher_task
+            except asyncio.CancelledError:
+                pass
+            self._batcher_task = None
+
         if self.client:
             await self.client.close()
             logger.info("Elasticsearch connection closed")
@@ -87,20 +186,39 @@ class ElasticsearchClient:
         """
         Check Elasticsearch cluster health
         Used by health endpoint to verify database connectivity
+        Results are reused for health_cache_ttl seconds to absorb frequent probes
 
         Returns:
             True if cluster is healthy (green or yellow), False otherwise
         """
-        try:
-            health = await self.client.cluster.health()
-            status = health['status']
-            # Yellow is acceptable (means replicas not fully allocated)
-            return status in ['green', 'yellow']
-        except Exception as e:
-            logger.error(f"Elasticsearch health check failed: {str(e)}")
-            return False
+        timestamp, healthy = self._health_cache
+        if time.monotonic() - timestamp < self.health_cache_ttl:
+            return healthy
+
+        async with self._health_lock:
+            # Another probe may have refreshed the result while we waited
+            timestamp, healthy = self._health_cache
+            if time.monotonic() - timestamp < self.health_cache_ttl:
+                return healthy
 
-    async def upsert_city(self, city: str, population: int) -> bool:
+            try:
+                health = await self.client.cluster.health()
+                status = health['status']
+                # Yellow is acceptable (means replicas not fully allocated)
+                healthy = status in ['green', 'yellow']
+            except Exception as e:
+                logger.error("Elasticsearch health check failed: %s", e)
+                healthy = False
+
+            self._health_cache = (time.monotonic(), healthy)
+            return healthy
+
+    async def upsert_city(
+        self,
+        city: str,
+        population: int,
+        refresh: Union[bool, str] = False
+    ) -> Dict[str, Any]:
         """
         Insert or update city population data
         Uses city name as document ID for automatic upsert behavior
@@ -108,31 +226,93 @@ class ElasticsearchClient:
         Args:
             city: City name (normalized to lowercase)
             population: Population count
+            refresh: Elasticsearch refresh policy; the default relies on the
+                index refresh interval, pass 'wait_for' for read-your-writes
 
         Returns:
-            True if operation successful
+            Raw Elasticsearch index response; its 'result' field is
+            'created' for new documents and 'updated' for existing ones
         """
         try:
             # Use city name as document ID for idempotent upserts
-            await self.client.index(
+            response = await self.client.index(
                 index=self.index_name,
                 id=city,  # Document ID = city name (ensures upsert)
                 body={
                     "city": city,
                     "population": population
                 },
-                refresh=True  # Make immediately searchable (use 'wait_for' in prod)
+                refresh=refresh
+            )
+            self._cache_version += 1
+            self._inflight.pop(city, None)  # Later readers must not join a stale lookup
+            self._cache_put(city, population)
+            logger.debug("Upserted city: %s with population: %s", city, population)
+            return response
+
+        except Exception as e:
+            logger.error("Failed to upsert city %s: %s", city, e)
+            raise
+
+    async def bulk_upsert(
+        self,
+        items: List[Tuple[str, int]],
+        refresh: Union[bool, str] = False
+    ) -> int:
+        """
+        Insert or update many cities using the bulk API
+        Documents are shipped in chunks instead of one request per city
+
+        Args:
+            items: (city, population) pairs, city normalized to lowercase
+            refresh: Elasticsearch refresh policy (see upsert_city)
+
+        Returns:
+            Number of documents successfully indexed
+        """
+        actions = (
+            {
+                "_op_type": "index",
+                "_index": self.index_name,
+                "_id": city,  # Document ID = city name (ensures upsert)
+                "_source": {
+                    "city": city,
+                    "population": population
+                }
+            }
+            for city, population in items
+        )
+
+        try:
+            success, _ = await async_bulk(
+                self.client.options(request_timeout=60),
+                actions,
+                chunk_size=1000,
+                refresh=refresh
             )
-            logger.debug(f"Upserted city: {city} with population: {population}")
-            return True
 
         except Exception as e:
-            logger.error(f"Failed to upsert city {city}: {str(e)}")
+            # Part of the batch may have been written; drop it from the cache
+            self._cache_version += 1
+            for city, _ in items:
+                self._inflight.pop(city, None)
+                self._cache.pop(city, None)
+            logger.error("Failed to bulk upsert %s cities: %s", len(items), e)
             raise
 
+        self._cache_version += 1
+        for city, population in items:
+            self._inflight.pop(city, None)
+            self._cache_put(city, population)
+        logger.debug("Bulk upserted %s cities", success)
+        return success
+
     async def get_city(self, city: str) -> Optional[int]:
         """
         Retrieve population for a specific city
+        Served from the in-process cache when possible; concurrent lookups
+        for the same city share one in-flight request, and lookups arriving
+        within the batch window share a single mget request
 
         Args:
             city: City name (normalized to lowercase)
@@ -140,56 +320,219 @@ class ElasticsearchClient:
         Returns:
             Population count if city exists, None otherwise
         """
+        if self.cache_ttl > 0:
+            entry = self._cache.get(city)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._cache.move_to_end(city)
+                    return entry[1]
+                del self._cache[city]
+
+        # Join an identical lookup that is already in flight
+        # (shielded so a cancelled request doesn't cancel it for the others)
+        inflight = self._inflight.get(city)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        version = self._cache_version
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[city] = future
+        future.add_done_callback(lambda done: self._inflight_done(city, done))
+        await self._lookup_queue.put((city, future))
+        population = await asyncio.shield(future)
+
+        # Skip caching misses, and hits if a write happened while this
+        # lookup was in flight
+        if population is not None and version == self._cache_version:
+            self._cache_put(city, population)
+        return population
+
+    def _inflight_done(self, city: str, future: asyncio.Future):
+        """
+        Forget a finished lookup unless a write already replaced it
+        """
+        if self._inflight.get(city) is future:
+            del self._inflight[city]
+
+        # Mark any failure as retrieved; every waiter may have been cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def _cache_put(self, city: str, population: int):
+        """
+        Store a lookup result in the cache, evicting the least recently used entry
+        """
+        if self.cache_ttl <= 0:
+            return
+        self._cache[city] = (time.monotonic() + self.cache_ttl, population)
+        self._cache.move_to_end(city)
+        if len(self._cache) > self.cache_maxsize:
+            self._cache.popitem(last=False)
+
+    async def get_cities_mget(
+        self,
+        ids: List[str]
+    ) -> Dict[str, Union[Optional[int], Exception]]:
+        """
+        Retrieve populations for several cities in one round trip
+
+        Args:
+            ids: City names (normalized to lowercase)
+
+        Returns:
+            Mapping of city name to population (None if city doesn't exist),
+            or to an exception if Elasticsearch failed to fetch that document
+        """
+        # A lone lookup is cheaper as a plain GET than as an mget
+        if len(ids) == 1:
+            return {ids[0]: await self._get_single(ids[0])}
+
         try:
-            # Retrieve document by ID (city name)
-            response = await self.client.get(
+            response = await self.client.mget(
                 index=self.index_name,
-                id=city,
+                body={"ids": ids},
                 _source=['population']  # Only fetch population field
             )
 
-            return response['_source']['population']
-
         except Exception as e:
-            # Document not found or other error
-            error_str = str(e).lower()
-            if 'not_found' in error_str or 'notfounderror' in error_str or "'found': false" in error_str:
-                logger.debug(f"City not found: {city}")
-                return None
+            logger.error("Error retrieving cities %s: %s", ids, e)
+            raise
+
+        results: Dict[str, Union[Optional[int], Exception]] = {}
+        for doc in response['docs']:
+            if 'error' in doc:
+                # Per-document failure (e.g. shard unavailable), not a miss
+                logger.error("Error retrieving city %s: %s", doc['_id'], doc['error'])
+                results[doc['_id']] = RuntimeError(
+                    f"Failed to retrieve city {doc['_id']}: {doc['error']}"
+                )
+            elif doc.get('found'):
+                results[doc['_id']] = doc['_source']['population']
             else:
-                logger.error(f"Error retrieving city {city}: {str(e)}")
-                raise
+                results[doc['_id']] = None
+        return results
 
-    async def list_all_cities(self) -> List[Dict[str, Any]]:
+    async def _get_single(self, city: str) -> Optional[int]:
         """
-        Retrieve all cities and their populations
-        Useful for debugging and verification
+        Retrieve one city by document ID
+        A missing document is reported via the 404 status, not an exception
+
+        Args:
+            city: City name (normalized to lowercase)
 
         Returns:
-            List of dictionaries containing city and population data
+            Population count if city exists, None otherwise
         """
         try:
-            # Search for all documents (use pagination for large datasets in production)
-            response = await self.client.search(
+            response = await self.client.options(ignore_status=404).get(
                 index=self.index_name,
-                body={
-                    "query": {"match_all": {}},
-                    "size": 10000,  # Max results (use scroll API for larger datasets)
-                    "sort": [{"city": "asc"}]  # Sort alphabetically
-                }
+                id=city,
+                _source=['population']  # Only fetch population field
             )
 
-            # Extract city data from search results
-            cities = [
-                {
-                    "city": hit['_source']['city'],
-                    "population": hit['_source']['population']
-                }
-                for hit in response['hits']['hits']
-            ]
+        except Exception as e:
+            logger.error("Error retrieving city %s: %s", city, e)
+            raise
+
+        if response.meta.status == 404:
+            logger.debug("City not found: %s", city)
+            return None
 
-            return cities
+        return response['_source']['population']
 
+    async def _run_batcher(self):
+        """
+        Drain queued lookups into batches of up to batch_max_size, waiting at
+        most batch_max_wait for a batch to fill, then resolve them via mget
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # Block until the first lookup of a new batch arrives
+            city, future = await self._lookup_queue.get()
+            pending: Dict[str, List[asyncio.Future]] = {city: [future]}
+            count = 1
+            deadline = loop.time() + self.batch_max_wait
+
+            while count < self.batch_max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    city, future = await asyncio.wait_for(self._lookup_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.setdefault(city, []).append(future)
+                count += 1
+
+            # Resolve in the background so the next batch can start filling
+            task = asyncio.create_task(self._resolve_batch(pending))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _resolve_batch(self, pending: Dict[str, List[asyncio.Future]]):
+        """
+        Issue one mget for a batch and fan results back to waiting lookups
+        """
+        try:
+            results = await self.get_cities_mget(list(pending))
         except Exception as e:
-            logger.error(f"Error listing cities: {str(e)}")
-            raise
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for city, futures in pending.items():
+            result = results.get(city)
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def list_all_cities(self, page_size: int = 500) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Retrieve all cities and their populations, one page at a time
+        Uses search_after keyset pagination so cost doesn't grow with offset
+
+        Args:
+            page_size: Number of cities fetched per search request
+
+        Yields:
+            Lists of dictionaries containing city and population data
+        """
+        body: Dict[str, Any] = {
+            "query": {"match_all": {}},
+            "size": page_size,
+            "sort": [{"city": "asc"}],  # Sort alphabetically (also the page key)
+            "_source": ["population"]  # City name is the document ID
+        }
+
+        while True:
+            try:
+                response = await self.client.search(index=self.index_name, body=body)
+            except Exception as e:
+                logger.error("Error listing cities: %s", e)
+                raise
+
+            hits = response['hits']['hits']
+
+            # Extract city data from search results
+            if hits:
+                yield [
+                    {
+                        "city": hit['_id'],
+                        "population": hit['_source']['population']
+                    }
+                    for hit in hits
+                ]
+
+            # A short page means there is nothing left to fetch
+            if len(hits) < page_size:
+                return
+
+            # Continue after the last hit of this page
+            body["search_after"] = hits[-1]['sort']
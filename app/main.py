@@ -3,15 +3,19 @@ Main FastAPI application for City Population Management API
 Provides REST endpoints for health checks, upserting, and querying city populations
 """
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
 import logging
-from typing import Dict, Any
+import msgspec
+import re
+from pydantic import TypeAdapter, ValidationError
+from typing import Dict, Any, List
 
-from app.models import CityPopulation, CityQuery, HealthResponse
+from app.models import CityPopulation, HealthResponse, CityIn, CityOut
 from app.database import ElasticsearchClient
-from app.config import settings
+from app.config import get_settings
 
 # Configure structured logging for production observability
 logging.basicConfig(
@@ -20,7 +24,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Global Elasticsearch client instance
+# Shared msgspec encoder for pre-serialized responses on hot read paths
+_encoder = msgspec.json.Encoder()
+
+# OpenAPI schemas for the msgspec-encoded responses, which FastAPI can't infer
+_CITY_OUT_SCHEMA = msgspec.json.schema_components([CityOut])[1]["CityOut"]
+_CITY_LIST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cities": {"type": "array", "items": _CITY_OUT_SCHEMA},
+        "count": {"type": "integer"}
+    },
+    "required": ["cities", "count"]
+}
+
+# Shared msgspec decoder for bulk upsert request bodies; lax mode coerces
+# values like "1" to int, matching pydantic's validation of POST /city
+_bulk_decoder = msgspec.json.Decoder(List[CityIn], strict=False)
+
+# Upsert bodies are validated with a single module-level adapter instead of
+# FastAPI's per-request body resolution; its schema documents both upserts
+_CITY_ADAPTER = TypeAdapter(CityPopulation)
+_CITY_SCHEMA = _CITY_ADAPTER.json_schema()
+
+# Global Elasticsearch client instance, shared by all requests so its
+# connection pool is reused (created once in lifespan)
 es_client = None
 
 
@@ -28,20 +56,31 @@ es_client = None
 async def lifespan(app: FastAPI):
     """
     Lifespan context manager for startup and shutdown events
-    - Initializes Elasticsearch connection on startup
+    - Initializes Elasticsearch connection on startup and warms it up
     - Gracefully closes connections on shutdown
     """
     global es_client
+    settings = get_settings()
 
     # Startup: Initialize database connection
     logger.info("Starting application...")
     es_client = ElasticsearchClient(
         hosts=settings.ELASTICSEARCH_HOST,
-        index_name=settings.ELASTICSEARCH_INDEX
+        index_name=settings.ELASTICSEARCH_INDEX,
+        batch_max_size=settings.ELASTICSEARCH_BATCH_MAX_SIZE,
+        batch_max_wait_ms=settings.ELASTICSEARCH_BATCH_MAX_WAIT_MS,
+        pool_maxsize=settings.ELASTICSEARCH_POOL_MAXSIZE,
+        refresh_interval=settings.ELASTICSEARCH_REFRESH_INTERVAL,
+        cache_maxsize=settings.CACHE_MAXSIZE,
+        cache_ttl=settings.CACHE_TTL_SECONDS,
+        health_cache_ttl=settings.HEALTH_CACHE_TTL
     )
     await es_client.connect()
     logger.info("Elasticsearch connection established")
 
+    # Prime the connection pool so the first requests don't pay for it
+    await es_client.warm_up(settings.ELASTICSEARCH_POOL_MAXSIZE // 4)
+
     yield  # Application runs here
 
     # Shutdown: Clean up resources
@@ -51,15 +90,24 @@ async def lifespan(app: FastAPI):
 
 
 # Initialize FastAPI application with metadata for API documentation
+# Responses are serialized with orjson (C implementation) by default
 app = FastAPI(
     title="City Population API",
     description="RESTful API for managing city population data",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
-@app.get("/health", response_model=HealthResponse, status_code=status.HTTP_200_OK)
+# response_model=None skips re-validating the returned dict on every probe;
+# HealthResponse is still used to document the response shape
+@app.get(
+    "/health",
+    response_model=None,
+    responses={200: {"model": HealthResponse}},
+    status_code=status.HTTP_200_OK
+)
 async def health_check() -> Dict[str, Any]:
     """
     Health check endpoint for Kubernetes liveness and readiness probes
@@ -78,7 +126,7 @@ async def health_check() -> Dict[str, Any]:
         if not db_status:
             # Database unhealthy - return 503 to fail health probes
             logger.error("Elasticsearch health check failed")
-            return JSONResponse(
+            return ORJSONResponse(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 content={
                     "status": "unhealthy",
@@ -94,8 +142,8 @@ async def health_check() -> Dict[str, Any]:
         }
 
     except Exception as e:
-        logger.error(f"Health check error: {str(e)}")
-        return JSONResponse(
+        logger.error("Health check error: %s", e)
+        return ORJSONResponse(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             content={
                 "status": "unhealthy",
@@ -105,13 +153,21 @@ async def health_check() -> Dict[str, Any]:
         )
 
 
-@app.post("/city", status_code=status.HTTP_200_OK)
-async def upsert_city(city_data: CityPopulation) -> Dict[str, Any]:
+@app.post(
+    "/city",
+    response_model=None,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _CITY_SCHEMA}}
+        }
+    }
+)
+async def upsert_city(request: Request) -> Dict[str, Any]:
     """
     Upsert endpoint: Insert or update city population data
-
-    Args:
-        city_data: CityPopulation model containing city name and population
+    The body is a CityPopulation object, validated with a shared TypeAdapter
 
     Returns:
         - message: Success message
@@ -121,29 +177,36 @@ async def upsert_city(city_data: CityPopulation) -> Dict[str, Any]:
 
     Raises:
         - 400 Bad Request if validation fails
+        - 422 Unprocessable Entity if the body fails validation
         - 500 Internal Server Error if database operation fails
     """
     try:
-        # Normalize city name to lowercase for consistent querying
-        city_name = city_data.city.lower().strip()
+        city_data = _CITY_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        # Report errors in the same shape as FastAPI's body validation
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+        )
+
+    try:
+        # City name is already normalized by the CityPopulation validator
+        city_name = city_data.city
         population = city_data.population
 
         # Validate population is non-negative
         if population < 0:
-            logger.warning(f"Invalid population value: {population}")
+            logger.warning("Invalid population value: %s", population)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Population must be a non-negative integer"
             )
 
-        # Check if city already exists to determine operation type
-        existing = await es_client.get_city(city_name)
-        operation = "update" if existing else "insert"
-
-        # Perform upsert operation in Elasticsearch
-        await es_client.upsert_city(city_name, population)
+        # Perform upsert operation in Elasticsearch; the index response
+        # tells us whether the document was created or overwritten
+        response = await es_client.upsert_city(city_name, population)
+        operation = "insert" if response["result"] == "created" else "update"
 
-        logger.info(f"Successfully {operation}ed city: {city_name} with population: {population}")
+        logger.debug("Successfully %sed city: %s with population: %s", operation, city_name, population)
 
         return {
             "message": f"City {operation}ed successfully",
@@ -157,15 +220,97 @@ async def upsert_city(city_data: CityPopulation) -> Dict[str, Any]:
         raise
     except Exception as e:
         # Log and return 500 for unexpected errors
-        logger.error(f"Error upserting city {city_data.city}: {str(e)}")
+        logger.error("Error upserting city %s: %s", city_data.city, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upsert city: {str(e)}"
         )
 
 
-@app.get("/city/{city_name}", status_code=status.HTTP_200_OK)
-async def get_city_population(city_name: str) -> Dict[str, Any]:
+def _msgspec_errors(error: msgspec.DecodeError) -> List[Dict[str, Any]]:
+    """
+    Convert a msgspec decode error into FastAPI's validation error list
+    msgspec reports the failing location as a suffix like " - at `$[0].city`"
+    """
+    msg, _, path = str(error).partition(" - at `$")
+    loc: List[Any] = ["body"]
+    for index, key in re.findall(r"\[(\d+)\]|\.(\w+)", path):
+        loc.append(int(index) if index else key)
+
+    return [{
+        "type": "value_error" if isinstance(error, msgspec.ValidationError) else "json_invalid",
+        "loc": tuple(loc),
+        "msg": msg
+    }]
+
+
+@app.post(
+    "/cities",
+    response_model=None,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": _CITY_SCHEMA}
+                }
+            }
+        }
+    }
+)
+async def bulk_upsert_cities(request: Request) -> Dict[str, Any]:
+    """
+    Bulk upsert endpoint: Insert or update many cities in one request
+    The body is a JSON array of CityPopulation objects, decoded with msgspec
+
+    Returns:
+        - message: Success message
+        - count: Number of cities upserted
+
+    Raises:
+        - 422 Unprocessable Entity if the body fails validation
+        - 500 Internal Server Error if database operation fails
+    """
+    try:
+        cities = _bulk_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        # Report errors in the same shape as FastAPI's body validation
+        raise RequestValidationError(_msgspec_errors(e))
+
+    try:
+        # City names are already normalized by CityIn
+        count = await es_client.bulk_upsert([(city.city, city.population) for city in cities])
+
+        logger.debug("Successfully bulk upserted %s cities", count)
+
+        return {
+            "message": "Cities upserted successfully",
+            "count": count
+        }
+
+    except Exception as e:
+        # Log and return 500 for unexpected errors
+        logger.error("Error bulk upserting cities: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upsert cities: {str(e)}"
+        )
+
+
+async def canonical_city(city_name: str) -> str:
+    """
+    Dependency that normalizes a city name path parameter for consistent lookups
+    """
+    return city_name.strip().lower()
+
+
+@app.get(
+    "/city/{city_name}",
+    responses={200: {"content": {"application/json": {"schema": _CITY_OUT_SCHEMA}}}},
+    status_code=status.HTTP_200_OK
+)
+async def get_city_population(city_name: str = Depends(canonical_city)) -> Response:
     """
     Query endpoint: Retrieve population for a specified city
 
@@ -181,33 +326,31 @@ async def get_city_population(city_name: str) -> Dict[str, Any]:
         - 500 Internal Server Error if database query fails
     """
     try:
-        # Normalize city name for consistent lookups
-        city_name = city_name.lower().strip()
-
         # Query Elasticsearch for city data
         result = await es_client.get_city(city_name)
 
         if result is None:
             # City not found in database
-            logger.warning(f"City not found: {city_name}")
+            logger.debug("City not found: %s", city_name)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"City '{city_name}' not found"
             )
 
-        logger.info(f"Retrieved population for city: {city_name}")
+        logger.debug("Retrieved population for city: %s", city_name)
 
-        return {
-            "city": city_name,
-            "population": result
-        }
+        # Encode directly with msgspec, bypassing FastAPI's serialization
+        return Response(
+            _encoder.encode(CityOut(city_name, result)),
+            media_type="application/json"
+        )
 
     except HTTPException:
         # Re-raise HTTP exceptions (not found errors)
         raise
     except Exception as e:
         # Log and return 500 for unexpected errors
-        logger.error(f"Error querying city {city_name}: {str(e)}")
+        logger.error("Error querying city %s: %s", city_name, e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to query city: {str(e)}"
@@ -215,27 +358,76 @@ async def get_city_population(city_name: str) -> Dict[str, Any]:
 
 
 # Optional: List all cities endpoint (useful for debugging)
-@app.get("/cities", status_code=status.HTTP_200_OK)
-async def list_all_cities() -> Dict[str, Any]:
+@app.get(
+    "/cities",
+    responses={200: {"content": {"application/json": {"schema": _CITY_LIST_SCHEMA}}}},
+    status_code=status.HTTP_200_OK
+)
+async def list_all_cities() -> StreamingResponse:
     """
     Bonus endpoint: List all cities and their populations
     Useful for debugging and data verification
+    Streams the result page by page instead of building it in memory
 
     Returns:
-        - count: Total number of cities
         - cities: List of all city-population pairs
+        - count: Total number of cities
+
+    Raises:
+        - 500 Internal Server Error if the first page can't be fetched
+
+    Note:
+        A failure on a later page happens after the 200 status has been sent;
+        it is logged and the response is aborted, so clients see an incomplete
+        body rather than a 500
     """
-    try:
-        cities = await es_client.list_all_cities()
+    pages = es_client.list_all_cities()
 
-        return {
-            "count": len(cities),
-            "cities": cities
-        }
+    try:
+        # Fetch the first page up front so database errors still map to a 500
+        first_page = await anext(pages, [])
 
     except Exception as e:
-        logger.error(f"Error listing cities: {str(e)}")
+        logger.error("Error listing cities: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to list cities: {str(e)}"
         )
+
+    async def stream_cities():
+        count = 0
+        page = first_page
+        yield b'{"cities":['
+
+        while page:
+            # Encode each page as a JSON array and splice its items in
+            encoded = _encoder.encode([CityOut(city["city"], city["population"]) for city in page])
+            yield (b"," if count else b"") + encoded[1:-1]
+            count += len(page)
+
+            try:
+                page = await anext(pages, None)
+            except Exception as e:
+                # Headers are already sent; abort the stream instead of
+                # finishing it as a valid-looking but truncated document
+                logger.error("Error listing cities after %s cities were streamed: %s", count, e)
+                raise
+
+        yield b'],"count":' + _encoder.encode(count) + b'}'
+
+    return StreamingResponse(stream_cities(), media_type="application/json")
+
+
+if __name__ == "__main__":
+    # Local entrypoint (python -m app.main) with the same fast loop and
+    # HTTP parser as the container command
+    import uvicorn
+
+    settings = get_settings()
+    uvicorn.run(
+        "app.main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        loop="uvloop",
+        http="httptools"
+    )
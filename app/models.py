@@ -1,10 +1,12 @@
 """
 Pydantic models for request/response validation and serialization
 Provides automatic validation, type checking, and API documentation
+msgspec structs are used for fast encoding on hot read endpoints
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import Optional
+import msgspec
+from typing import Annotated
+from pydantic import BaseModel, Field, field_validator
 
 
 class CityPopulation(BaseModel):
@@ -17,48 +19,36 @@ class CityPopulation(BaseModel):
         min_length=1,
         max_length=100,
         description="Name of the city",
-        example="New York"
+        examples=["New York"]
     )
     population: int = Field(
         ...,  # Required field
         ge=0,  # Greater than or equal to 0
         description="Population count (must be non-negative)",
-        example=8336817
+        examples=[8336817]
     )
 
-    @validator('city')
-    def validate_city_name(cls, v):
+    @field_validator('city')
+    @classmethod
+    def validate_city_name(cls, v: str) -> str:
         """
-        Custom validator to ensure city name is not empty after stripping whitespace
+        Custom validator that normalizes the city name (stripped, lowercase)
+        and ensures it is not empty after stripping whitespace
         """
-        if not v.strip():
+        v = v.strip().lower()
+        if not v:
             raise ValueError("City name cannot be empty or whitespace only")
-        return v.strip()
+        return v
 
-    class Config:
-        # Enable JSON schema generation for OpenAPI docs
-        schema_extra = {
+    # Enable JSON schema generation for OpenAPI docs
+    model_config = {
+        "json_schema_extra": {
             "example": {
                 "city": "Tokyo",
                 "population": 13960000
             }
         }
-
-
-class CityQuery(BaseModel):
-    """
-    Model for city query responses
-    """
-    city: str = Field(description="Name of the city")
-    population: int = Field(description="Population count")
-
-    class Config:
-        schema_extra = {
-            "example": {
-                "city": "london",
-                "population": 9002488
-            }
-        }
+    }
 
 
 class HealthResponse(BaseModel):
@@ -68,9 +58,36 @@ class HealthResponse(BaseModel):
     """
     status: str = Field(
         description="Overall application status",
-        example="OK"
+        examples=["OK"]
     )
     database: str = Field(
         description="Database connection status",
-        example="connected"
+        examples=["connected"]
     )
+
+
+class CityIn(msgspec.Struct):
+    """
+    City population record decoded by msgspec for bulk upserts
+    Mirrors the constraints of CityPopulation without per-item pydantic overhead
+    """
+    city: Annotated[str, msgspec.Meta(min_length=1, max_length=100)]
+    population: Annotated[int, msgspec.Meta(ge=0)]
+
+    def __post_init__(self):
+        """
+        Normalize the city name the same way CityPopulation's validator does
+        """
+        self.city = self.city.strip().lower()
+        if not self.city:
+            raise ValueError("City name cannot be empty or whitespace only")
+
+
+class CityOut(msgspec.Struct):
+    """
+    Lightweight city population record encoded directly by msgspec
+    Used on read endpoints to skip pydantic model construction
+    """
+    city: str
+    population: int
+
@@ -0,0 +1,238 @@
+"""
+Concurrency tests for ElasticsearchClient lookup batching, caching and single-flight
+Runs against an in-memory stand-in for AsyncElasticsearch
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app import database
+from app.database import ElasticsearchClient
+
+
+class FakeResponse(dict):
+    """
+    Dict response carrying a transport-style meta.status
+    """
+    def __init__(self, body, status=200):
+        super().__init__(body)
+        self.meta = SimpleNamespace(status=status)
+
+
+class FakeElasticsearch:
+    """
+    Minimal AsyncElasticsearch stub recording every request it serves
+    Reads snapshot the stored value before their simulated network delay
+    """
+
+    def __init__(self, docs=None, delay=0.05):
+        self.docs = dict(docs or {})
+        self.delay = delay
+        self.error = None
+        self.calls = []
+        self.health_calls = 0
+        self.cluster = SimpleNamespace(health=self._health)
+        self.indices = SimpleNamespace(exists=self._exists)
+
+    def options(self, **kwargs):
+        return self
+
+    async def _health(self, **kwargs):
+        self.health_calls += 1
+        await asyncio.sleep(self.delay)
+        return {"status": "green"}
+
+    async def _exists(self, index):
+        return True
+
+    async def get(self, index, id, _source):
+        self.calls.append(("get", id))
+        value = self.docs.get(id)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if value is None:
+            return FakeResponse({"found": False}, status=404)
+        return FakeResponse({"_source": {"population": value}})
+
+    async def mget(self, index, body, _source):
+        self.calls.append(("mget", sorted(body["ids"])))
+        values = {city: self.docs.get(city) for city in body["ids"]}
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {"docs": [
+            {"_id": city, "found": True, "_source": {"population": value}}
+            if value is not None else {"_id": city, "found": False}
+            for city, value in values.items()
+        ]}
+
+    async def index(self, index, id, body, refresh):
+        result = "updated" if id in self.docs else "created"
+        self.docs[id] = body["population"]
+        return {"result": result}
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    fake = FakeElasticsearch(docs={"london": 9002488, "tokyo": 13960000})
+    monkeypatch.setattr(database, "AsyncElasticsearch", lambda **kwargs: fake)
+    return fake
+
+
+def run(test, **client_kwargs):
+    """
+    Run an async test body against a connected client
+    """
+    async def main():
+        client = ElasticsearchClient("http://es:9200", "cities", **client_kwargs)
+        await client.connect()
+        try:
+            await test(client)
+        finally:
+            await client.close()
+
+    asyncio.run(main())
+
+
+def test_concurrent_same_key_lookups_share_one_request(fake_es):
+    async def test(client):
+        first = asyncio.create_task(client.get_city("london"))
+        await asyncio.sleep(0.01)  # Past the batch window, ES call in flight
+
+        results = await asyncio.gather(first, *[client.get_city("london") for _ in range(9)])
+
+        assert results == [9002488] * 10
+        assert fake_es.calls == [("get", "london")]
+
+    run(test)
+
+
+def test_mixed_keys_are_batched_into_one_mget(fake_es):
+    async def test(client):
+        results = await asyncio.gather(
+            client.get_city("london"),
+            client.get_city("tokyo"),
+            client.get_city("paris"),
+            client.get_city("london")
+        )
+
+        assert results == [9002488, 13960000, None, 9002488]
+        assert fake_es.calls == [("mget", ["london", "paris", "tokyo"])]
+
+    run(test)
+
+
+def test_cancelled_originator_still_resolves_joiners(fake_es):
+    async def test(client):
+        originator = asyncio.create_task(client.get_city("london"))
+        await asyncio.sleep(0.01)
+        joiners = [asyncio.create_task(client.get_city("london")) for _ in range(3)]
+        await asyncio.sleep(0)
+
+        originator.cancel()
+
+        assert await asyncio.gather(*joiners) == [9002488] * 3
+        assert originator.cancelled()
+        assert len(fake_es.calls) == 1
+
+    run(test)
+
+
+def test_write_during_inflight_read_is_not_overwritten(fake_es):
+    async def test(client):
+        read = asyncio.create_task(client.get_city("london"))
+        await asyncio.sleep(0.01)  # ES has already read the old value
+
+        await client.upsert_city("london", 9100000)
+
+        # The concurrent read may see the old value but must not cache it
+        assert await read == 9002488
+        assert await client.get_city("london") == 9100000
+        assert len(fake_es.calls) == 1
+
+    run(test, cache_ttl=30.0)
+
+
+def test_misses_are_not_cached(fake_es):
+    async def test(client):
+        assert await client.get_city("paris") is None
+        fake_es.docs["paris"] = 2102650  # Written through another replica
+
+        assert await client.get_city("paris") == 2102650
+
+    run(test, cache_ttl=30.0)
+
+
+def test_es_error_fans_out_to_every_waiter(fake_es):
+    fake_es.error = RuntimeError("cluster unavailable")
+
+    async def test(client):
+        results = await asyncio.gather(
+            client.get_city("london"),
+            client.get_city("london"),
+            client.get_city("tokyo"),
+            return_exceptions=True
+        )
+
+        assert all(result is fake_es.error for result in results)
+
+    run(test)
+
+
+def test_mget_document_error_is_not_reported_as_miss(fake_es):
+    async def failing_mget(index, body, _source):
+        return {"docs": [
+            {"_id": "london", "found": True, "_source": {"population": 9002488}},
+            {"_id": "tokyo", "error": {"type": "no_shard_available_action_exception"}}
+        ]}
+
+    fake_es.mget = failing_mget
+
+    async def test(client):
+        london, tokyo = await asyncio.gather(
+            client.get_city("london"),
+            client.get_city("tokyo"),
+            return_exceptions=True
+        )
+
+        assert london == 9002488
+        assert isinstance(tokyo, RuntimeError)
+
+    run(test, cache_ttl=30.0)
+
+
+def test_failed_lookup_with_cancelled_waiters_is_retrieved(fake_es):
+    fake_es.error = RuntimeError("cluster unavailable")
+
+    async def test(client):
+        lookup = asyncio.create_task(client.get_city("london"))
+        await asyncio.sleep(0.01)
+        shared = client._inflight["london"]
+
+        lookup.cancel()
+        await asyncio.sleep(fake_es.delay * 2)  # Let the ES call fail
+
+        # asyncio logs "Future exception was never retrieved" on collection
+        # of a failed future unless its exception was read
+        assert shared.done()
+        assert not shared._log_traceback
+
+    run(test)
+
+
+def test_concurrent_health_checks_share_one_request(fake_es):
+    async def test(client):
+        calls_before = fake_es.health_calls
+
+        results = await asyncio.gather(*[client.health_check() for _ in range(10)])
+
+        assert results == [True] * 10
+        assert fake_es.health_calls == calls_before + 1
+
+    run(test, health_cache_ttl=1.0)